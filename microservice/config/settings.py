@@ -22,6 +22,12 @@ ALLOWED_HOSTS = [
     env('HOST')
 ]
 
+# Service profile: 'lean' drops the admin, sessions, messages and staticfiles apps, along with
+# their middleware, as the websocket and api endpoints don't use them. This cuts the imports
+# done when a worker starts cold.
+SERVICE_PROFILE = env('SERVICE_PROFILE', default='full')
+LEAN_PROFILE = SERVICE_PROFILE == 'lean'
+
 # Application definition
 INSTALLED_APPS = [
     # my apps
@@ -33,24 +39,35 @@ INSTALLED_APPS = [
     'corsheaders',
     'rest_framework',
     # base apps
-    'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
-    'django.contrib.sessions',
-    'django.contrib.messages',
-    'django.contrib.staticfiles',
 ]
 
-MIDDLEWARE = [
-    'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
-    "corsheaders.middleware.CorsMiddleware", # cors-headers middleware
-    'django.middleware.common.CommonMiddleware',
-    'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
-    'django.middleware.clickjacking.XFrameOptionsMiddleware',
-]
+if not LEAN_PROFILE:
+    INSTALLED_APPS += [
+        'django.contrib.admin',
+        'django.contrib.sessions',
+        'django.contrib.messages',
+        'django.contrib.staticfiles',
+    ]
+
+if LEAN_PROFILE:
+    MIDDLEWARE = [
+        'django.middleware.security.SecurityMiddleware',
+        "corsheaders.middleware.CorsMiddleware", # cors-headers middleware
+        'django.middleware.common.CommonMiddleware',
+    ]
+else:
+    MIDDLEWARE = [
+        'django.middleware.security.SecurityMiddleware',
+        'django.contrib.sessions.middleware.SessionMiddleware',
+        "corsheaders.middleware.CorsMiddleware", # cors-headers middleware
+        'django.middleware.common.CommonMiddleware',
+        'django.middleware.csrf.CsrfViewMiddleware',
+        'django.contrib.auth.middleware.AuthenticationMiddleware',
+        'django.contrib.messages.middleware.MessageMiddleware',
+        'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    ]
 
 ROOT_URLCONF = 'config.urls'
 
@@ -63,9 +80,10 @@ TEMPLATES = [
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
+            ] + ([] if LEAN_PROFILE else [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
-            ],
+            ]),
         },
     },
 ]
@@ -87,21 +105,75 @@ CHANNEL_LAYERS = {
 # Authentication service
 USER_AUTH_API = env('USER_AUTH_API')
 
+# Access token verification: 'remote' asks the authentication service on every handshake,
+# 'hmac' and 'jwks' validate signed JWTs locally and fall back to the remote check for
+# tokens that are not JWTs when AUTH_REMOTE_FALLBACK is set. Local tokens must carry an exp
+# claim, checked with a leeway (s). The algorithms default to HS256 in hmac mode, and to
+# RS256 and ES256 in jwks mode
+AUTH_TOKEN_VERIFIER = env('AUTH_TOKEN_VERIFIER', default='remote')
+AUTH_REMOTE_FALLBACK = env.bool('AUTH_REMOTE_FALLBACK', default=True)
+AUTH_JWT_SECRET = env('AUTH_JWT_SECRET', default='')
+AUTH_JWT_ALGORITHMS = env.list('AUTH_JWT_ALGORITHMS', default=[])
+AUTH_JWT_LEEWAY = env.int('AUTH_JWT_LEEWAY', default=30)
+AUTH_JWT_AUDIENCE = env('AUTH_JWT_AUDIENCE', default=None)
+AUTH_JWT_ISSUER = env('AUTH_JWT_ISSUER', default=None)
+AUTH_JWKS_URL = env('AUTH_JWKS_URL', default='')
+AUTH_JWKS_REFRESH_INTERVAL = env.int('AUTH_JWKS_REFRESH_INTERVAL', default=300)
+
+# Graceful drain on SIGUSR1: clients are told to reconnect after the delay plus a random
+# jitter (ms), sockets are closed in batches, and resume tokens stay valid for max age (s)
+DRAIN_RECONNECT_DELAY_MS = env.int('DRAIN_RECONNECT_DELAY_MS', default=1000)
+DRAIN_RECONNECT_JITTER_MS = env.int('DRAIN_RECONNECT_JITTER_MS', default=5000)
+DRAIN_BATCH_SIZE = env.int('DRAIN_BATCH_SIZE', default=100)
+DRAIN_BATCH_INTERVAL = env.float('DRAIN_BATCH_INTERVAL', default=0.1)
+RESUME_TOKEN_MAX_AGE = env.int('RESUME_TOKEN_MAX_AGE', default=120)
+
+# Blog notifications of the same type, on the same blog, for the same receiver are aggregated 
+# into one notification during the window (seconds), 0 disables the digest. The digest index is 
+# in memory, per worker: sockets of one user on different workers aggregate separately
+NOTIFICATION_DIGEST_WINDOW = env.float('NOTIFICATION_DIGEST_WINDOW', default=300)
+NOTIFICATION_DIGEST_MAX_ENTRIES = env.int('NOTIFICATION_DIGEST_MAX_ENTRIES', default=50000)
+
 # Origin allowed connection to server's websockets
 FRONTEND_ORIGIN = env("FRONTEND_ORIGIN")
 
 # Database
+# Connections are pooled per worker process (psycopg pool), so the async views and consumers 
+# share them across sync_to_async hops instead of opening one per thread. When a replica host 
+# is configured, notification and user reads are routed to it, with its own pool.
+DATABASE_CONNECTION = {
+    "ENGINE": "django.db.backends.postgresql",
+    "NAME": env("DB_NAME"),
+    "USER": env("DB_USER"),
+    "PASSWORD": env("DB_PASSWORD"),
+    "OPTIONS": {
+        "pool": {
+            "min_size": env.int("DB_POOL_MIN_SIZE", default=2),
+            "max_size": env.int("DB_POOL_MAX_SIZE", default=10),
+            "timeout": env.float("DB_POOL_TIMEOUT", default=10.0),
+        },
+    },
+}
+
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.postgresql",
-        "NAME": env("DB_NAME"),
-        "USER": env("DB_USER"),
-        "PASSWORD": env("DB_PASSWORD"),
+        **DATABASE_CONNECTION,
         "HOST": env("DB_HOST"),
         "PORT": env("DB_PORT"),
-    }
+    },
 }
 
+DATABASE_ROUTERS = []
+
+if env("DB_REPLICA_HOST", default=""):
+    DATABASES["replica"] = {
+        **DATABASE_CONNECTION,
+        "HOST": env("DB_REPLICA_HOST"),
+        "PORT": env("DB_REPLICA_PORT", default=env("DB_PORT")),
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_ROUTERS.append('notification.db.PrimaryReplicaRouter')
+
 # Internationalization
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'UTC'
@@ -127,4 +199,31 @@ REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': (
         'rest_framework.renderers.JSONRenderer',
     )
-}
\ No newline at end of file
+}
+
+# The api is called by the other services, not by logged in users, so the lean profile skips
+# the session and basic authentication of the requests
+if LEAN_PROFILE:
+    REST_FRAMEWORK.update({
+        'DEFAULT_AUTHENTICATION_CLASSES': [],
+        'DEFAULT_PERMISSION_CLASSES': [
+            'rest_framework.permissions.AllowAny',
+        ],
+        'UNAUTHENTICATED_USER': None,
+    })
+
+# Probes and introspection: readiness checks are cached (s) and time out (s), the event loop
+# lag is sampled every interval (s), and introspection is disabled without a token
+READINESS_CACHE_SECONDS = env.float('READINESS_CACHE_SECONDS', default=5)
+READINESS_CHECK_TIMEOUT = env.float('READINESS_CHECK_TIMEOUT', default=2)
+# The worker reports not ready above these event loop lag (ms) and websocket count, 0 disables
+READINESS_MAX_LOOP_LAG_MS = env.float('READINESS_MAX_LOOP_LAG_MS', default=250)
+READINESS_MAX_CONNECTIONS = env.int('READINESS_MAX_CONNECTIONS', default=10000)
+EVENT_LOOP_LAG_INTERVAL = env.float('EVENT_LOOP_LAG_INTERVAL', default=0.5)
+EVENT_LOOP_LAG_SAMPLES = env.int('EVENT_LOOP_LAG_SAMPLES', default=120)
+INTROSPECTION_TOKEN = env('INTROSPECTION_TOKEN', default='')
+INTROSPECTION_SLOWEST_HANDLERS = env.int('INTROSPECTION_SLOWEST_HANDLERS', default=10)
+
+# Cold start thresholds checked by the bench_startup command (ms)
+STARTUP_MAX_IMPORT_MS = env.int('STARTUP_MAX_IMPORT_MS', default=1500)
+STARTUP_MAX_FIRST_ACCEPT_MS = env.int('STARTUP_MAX_FIRST_ACCEPT_MS', default=3000)
\ No newline at end of file
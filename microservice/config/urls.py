@@ -1,7 +1,15 @@
-from django.contrib import admin
+from django.conf import settings
 from django.urls import path, include
 
+from notification import views
+
 urlpatterns = [
-    path('admin/', admin.site.urls),
+    path('healthz/', views.healthz),
+    path('readyz/', views.readyz),
     path('api/', include('notification.urls'))
 ]
+
+if 'django.contrib.admin' in settings.INSTALLED_APPS:
+    from django.contrib import admin
+
+    urlpatterns.append(path('admin/', admin.site.urls))
@@ -1,12 +1,104 @@
 import json
+import uuid
 
+from channels.exceptions import StopConsumer
 from channels.generic.websocket import AsyncWebsocketConsumer
 from django.utils import timezone
 
+from .db import release_connections
+from .digest import digest_index, record_digest_outcome
+from .drain import drain_coordinator, issue_resume_token
+from .health import handler_tracker, loop_monitor
 from .models import AppNotification
+from .topics import can_subscribe, is_valid_topic, topic_group_name, topic_index
 
 
-class NotificationConsumer(AsyncWebsocketConsumer):
+class DrainableConsumer(AsyncWebsocketConsumer):
+    """
+    Base consumer registering accepted websockets with the drain coordinator, so that
+        they can be closed gradually when the worker is about to restart. Handshakes
+        received while draining are told to reconnect later. The handlers running are
+        tracked to be reported by the introspection endpoint, and those of the database
+        messages return their connections to the pool once done.
+    """
+    drain_close_code = 1012
+    refused_close_code = 1013
+    database_messages: set[str] = set()
+    refused = False
+
+    async def __call__(self, scope, receive, send) -> None:
+        # Handlers raising end the consumer without a disconnect message being dispatched, so
+        # the websocket is also unregistered once the consumer stops, whatever the reason.
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            drain_coordinator.unregister(self)
+
+    async def websocket_connect(self, message: dict) -> None:
+        if self.scope.get('draining'):
+            self.refused = True
+            await super().accept()
+            await self.send_reconnect(drain_coordinator.reconnect_delay(), resume_token=None)
+            await self.close(code=self.refused_close_code)
+            return
+        await super().websocket_connect(message)
+
+    async def accept(self, *args, **kwargs) -> None:
+        drain_coordinator.register(self)
+        loop_monitor.start()
+        await super().accept(*args, **kwargs)
+
+    async def dispatch(self, message: dict) -> None:
+        handler_id = handler_tracker.enter(type(self).__name__, message['type'])
+        try:
+            await super().dispatch(message)
+        finally:
+            handler_tracker.exit(handler_id)
+            if message['type'] in self.database_messages:
+                await release_connections()
+
+    async def websocket_disconnect(self, message: dict) -> None:
+        drain_coordinator.unregister(self)
+        if self.refused:
+            raise StopConsumer()
+        await super().websocket_disconnect(message)
+
+    async def drain(self, reconnect_after_ms: int) -> None:
+        """
+        Tells the client when to reconnect, hands out a resume token, and closes the websocket.
+
+        Parameters:
+            reconnect_after_ms (int): Delay, jitter included, before the client reconnects.
+        """
+        email = self.scope.get('user_email')
+        await self.send_reconnect(
+            reconnect_after_ms,
+            resume_token=issue_resume_token(email) if email else None
+        )
+        await self.close(code=self.drain_close_code)
+
+    async def send_reconnect(self, reconnect_after_ms: int, resume_token: str | None) -> None:
+        """
+        Sends the control message asking the client to reconnect after a delay.
+
+        Parameters:
+            reconnect_after_ms (int): Delay, jitter included, before the client reconnects.
+            resume_token (str): Token allowing the client to reconnect without the auth service.
+        """
+        await self.send(
+            text_data=json.dumps(
+                {
+                    "control": "reconnect",
+                    "after_ms": reconnect_after_ms,
+                    "resume_token": resume_token,
+                }
+            )
+        )
+
+
+class NotificationConsumer(DrainableConsumer):
+    database_messages = {'send.notification'}
+
     async def connect(self) -> None:
         """
         Connects the client to the websocket.
@@ -41,8 +133,10 @@ class NotificationConsumer(AsyncWebsocketConsumer):
     async def send_notification(self, event: dict) -> None:
         """
         Sends a message to the notified user's channel. It receives the validated data
-            to create a new notification instance, and sends the notification message 
-            to the clients through their associated WebSockets.
+            to store the notification, and sends the notification message to the clients 
+            through their associated WebSockets. Within the digest window, repeated events 
+            of the same type on the same blog update a single aggregated notification, 
+            and the message carries its id and event count so the client can replace it.
         
         Parameters:
             event (dict): Websocket event containing the validated data dictionary. 
@@ -50,25 +144,110 @@ class NotificationConsumer(AsyncWebsocketConsumer):
         validated_data: dict = event["validated_data"]
 
         validated_data['timestamp'] = timezone.now()
-        validated_data['text'] = await self.generate_message(
-            sender_name=validated_data['sender_name'],
-            notification_type=validated_data['type']
-        )
-        
-        validated_data.pop('sender_name')
+        event_id = validated_data.pop('event_id', None) or uuid.uuid4().hex
+        sender_name = validated_data.pop('sender_name')
 
-        await AppNotification.objects.acreate(**validated_data)
+        if digest_index.window > 0:
+            notification_id, count, text = await self.store_digest(validated_data, event_id, sender_name)
+        else:
+            notification_id, count, text = await self.store_notification(validated_data, sender_name)
 
         await self.send(
             text_data=json.dumps(
                 {
+                    "notification_id": notification_id,
                     "blog_id": validated_data['blog_id'],
-                    "message": validated_data['text'],
-                    "type": validated_data["type"]
+                    "message": text,
+                    "type": validated_data["type"],
+                    "count": count
                 }
             )
         )
 
+    async def store_notification(self, validated_data: dict, sender_name: str) -> tuple[int, int, str]:
+        """
+        Creates a new notification instance.
+
+        Parameters:
+            validated_data (dict): The notification fields.
+            sender_name (str): The full name of the user sending the notification.
+        Returns:
+            tuple[int, int, str]: The notification id, the event count, and the message.
+        """
+        validated_data['text'] = await self.generate_message(
+            sender_name=sender_name,
+            notification_type=validated_data['type']
+        )
+        notification = await AppNotification.objects.acreate(**validated_data)
+        record_digest_outcome('created')
+        return notification.pk, 1, validated_data['text']
+
+    async def store_digest(self, validated_data: dict, event_id: str, sender_name: str) -> tuple[int, int, str]:
+        """
+        Stores the notification through the digest index. The first event of a (receiver, blog, 
+            type) key within the window creates the notification, the following events update 
+            it, and events already applied are not written again.
+
+        Parameters:
+            validated_data (dict): The notification fields.
+            event_id (str): The unique id of the event sent by the api view.
+            sender_name (str): The full name of the user sending the notification.
+        Returns:
+            tuple[int, int, str]: The notification id, the event count, and the message.
+        """
+        key = (validated_data['receiver_id'], validated_data['blog_id'], validated_data['type'].lower())
+        entry = digest_index.get(key)
+
+        if entry is None:
+            entry = digest_index.open(key)
+            entry.add(event_id, sender_name)
+            try:
+                notification_id, count, text = await self.store_notification(validated_data, sender_name)
+                entry.notification_id = notification_id
+                return notification_id, count, text
+            except Exception:
+                digest_index.invalidate(key, entry)
+                raise
+            finally:
+                entry.ready.set()
+
+        await entry.ready.wait()
+        async with entry.lock:
+            if entry.invalid:
+                # The entry was dropped while waiting, the event is looked up again so that it
+                # resolves to the entry now holding it, or opens a new aggregate.
+                return await self.store_digest(validated_data, event_id, sender_name)
+
+            if event_id in entry.event_ids:
+                record_digest_outcome('duplicates')
+                text = await self.generate_message(
+                    sender_name=entry.display_name(),
+                    notification_type=validated_data['type']
+                )
+                return entry.notification_id, entry.count, text
+
+            entry.add(event_id, sender_name)
+            text = await self.generate_message(
+                sender_name=entry.display_name(),
+                notification_type=validated_data['type']
+            )
+            try:
+                updated = await AppNotification.objects.filter(pk=entry.notification_id).aupdate(
+                    text=text,
+                    sender_id=validated_data['sender_id'],
+                    timestamp=validated_data['timestamp']
+                )
+            except Exception:
+                digest_index.invalidate(key, entry)
+                raise
+            if not updated:
+                # The aggregated notification was deleted, the event opens a new aggregate.
+                digest_index.invalidate(key, entry)
+                return await self.store_digest(validated_data, event_id, sender_name)
+
+        record_digest_outcome('merged')
+        return entry.notification_id, entry.count, text
+
     @staticmethod
     async def generate_message(sender_name: str, notification_type: str) -> str:
         """
@@ -94,7 +273,7 @@ class NotificationConsumer(AsyncWebsocketConsumer):
             return f'{sender_name} has given you blog feedback.'
         
 
-class EventConsumer(AsyncWebsocketConsumer):
+class EventConsumer(DrainableConsumer):
     async def connect(self) -> None:
         """
         Connects the client to the websocket.
@@ -144,4 +323,137 @@ class EventConsumer(AsyncWebsocketConsumer):
                     "message": event_message,
                 }
             )
+        )
+
+
+class TopicConsumer(DrainableConsumer):
+    database_messages = {'websocket.receive'}
+
+    async def connect(self) -> None:
+        """
+        Connects the client to the websocket. Topics are joined afterwards through
+            subscribe messages sent over the socket.
+        """
+        self.connection_denied_code = 4000
+        self.max_topics = 100
+
+        if self.scope['user_auth']:
+            await self.accept()
+        else:
+            await self.close(code=self.connection_denied_code)
+
+    async def disconnect(self, close_code: int) -> None:
+        """
+        Disconnects the client from the websocket and drops all its topic subscriptions.
+
+        Parameters:
+            close_code (int): Websocket connection close code.
+        """
+        for topic in topic_index.leave_all(self.channel_name):
+            await self.channel_layer.group_discard(
+                topic_group_name(topic),
+                self.channel_name
+            )
+
+    async def receive(self, text_data: str = None, bytes_data: bytes = None) -> None:
+        """
+        Handles the subscription requests sent by the client. The expected payload is
+            {"action": "subscribe" | "unsubscribe", "topic": "blog_<id>" | "category_<id>"},
+            and every request is acknowledged with its resulting status.
+
+        Parameters:
+            text_data (str): The JSON payload sent by the client.
+            bytes_data (bytes): Unused, binary frames are ignored.
+        """
+        try:
+            data = json.loads(text_data or '')
+            action = data['action']
+            topic = data['topic']
+        except (ValueError, TypeError, KeyError):
+            return await self.send_ack(None, None, 'invalid-request')
+
+        if not is_valid_topic(topic):
+            return await self.send_ack(action, topic, 'invalid-topic')
+
+        if action == 'subscribe':
+            status = await self.subscribe(topic)
+        elif action == 'unsubscribe':
+            status = await self.unsubscribe(topic)
+        else:
+            status = 'invalid-action'
+
+        await self.send_ack(action, topic, status)
+
+    async def subscribe(self, topic: str) -> str:
+        """
+        Adds the websocket to the topic group if the user is allowed to follow it.
+
+        Parameters:
+            topic (str): A well formed topic name.
+        Returns:
+            str: The subscription status sent back to the client.
+        """
+        if topic in topic_index.topics(self.channel_name):
+            return 'subscribed'
+        if len(topic_index.topics(self.channel_name)) >= self.max_topics:
+            return 'limit-reached'
+        if not await can_subscribe(topic, self.scope['user_id']):
+            return 'denied'
+
+        topic_index.join(topic, self.channel_name)
+        await self.channel_layer.group_add(
+            topic_group_name(topic),
+            self.channel_name
+        )
+        return 'subscribed'
+
+    async def unsubscribe(self, topic: str) -> str:
+        """
+        Removes the websocket from the topic group.
+
+        Parameters:
+            topic (str): A well formed topic name.
+        Returns:
+            str: The subscription status sent back to the client.
+        """
+        if topic_index.leave(topic, self.channel_name):
+            await self.channel_layer.group_discard(
+                topic_group_name(topic),
+                self.channel_name
+            )
+        return 'unsubscribed'
+
+    async def send_ack(self, action: str | None, topic: str | None, status: str) -> None:
+        """
+        Acknowledges a subscription request.
+
+        Parameters:
+            action (str): The action requested by the client.
+            topic (str): The topic targeted by the request.
+            status (str): The outcome of the request.
+        """
+        await self.send(
+            text_data=json.dumps(
+                {
+                    "action": action,
+                    "topic": topic,
+                    "status": status,
+                }
+            )
+        )
+
+    async def send_topic(self, event: dict) -> None:
+        """
+        Sends a message published to one of the topics followed by the client.
+
+        Parameters:
+            event (dict): Websocket event containing the topic and the message.
+        """
+        await self.send(
+            text_data=json.dumps(
+                {
+                    "topic": event["topic"],
+                    "message": event["message"],
+                }
+            )
         )
\ No newline at end of file
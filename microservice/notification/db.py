@@ -0,0 +1,69 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+from .metrics import metrics
+
+
+REPLICA_DATABASE = 'replica'
+
+
+class PrimaryReplicaRouter:
+    """
+    Database router sending the notification and user lookups to the read replica, while every 
+        write goes to the primary database. Models that are not listed are read from the primary.
+    """
+    replica_models = {'appnotification', 'user'}
+
+    def db_for_read(self, model, **hints) -> str:
+        if model._meta.model_name in self.replica_models and REPLICA_DATABASE in settings.DATABASES:
+            return REPLICA_DATABASE
+        return 'default'
+
+    def db_for_write(self, model, **hints) -> str:
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints) -> bool:
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints) -> bool:
+        return db == 'default'
+
+
+async def release_connections() -> None:
+    """
+    Returns the connections used by the async ORM calls to the pool. Outside of the http request 
+        cycle nothing closes them, so the websocket handshake and the consumer handlers call this 
+        once done with the database, as channels' database_sync_to_async does. It runs on the 
+        thread-sensitive executor, the thread owning the connections of the async ORM calls.
+    """
+    await sync_to_async(close_old_connections)()
+
+
+def update_pool_metrics() -> dict:
+    """
+    Reads the statistics of the connection pool of every database alias and stores them as 
+        gauges. Saturation is the share of the pool's maximum size currently checked out, and 
+        requests waiting shows the handlers blocked on a full pool.
+
+    Returns:
+        dict: The pool statistics per database alias.
+    """
+    stats = {}
+    for alias in connections:
+        pool = connections[alias].pool
+        if pool is None:
+            continue
+        pool_stats = pool.get_stats()
+        in_use = pool_stats['pool_size'] - pool_stats['pool_available']
+        stats[alias] = {
+            'size': pool_stats['pool_size'],
+            'max_size': pool.max_size,
+            'in_use': in_use,
+            'requests_waiting': pool_stats['requests_waiting'],
+            'connections_opened': pool_stats.get('connections_num', 0),
+            'saturation': in_use / pool.max_size,
+        }
+        for name, value in stats[alias].items():
+            metrics.set(f'db.{alias}.pool.{name}', value)
+    return stats
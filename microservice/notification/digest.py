@@ -0,0 +1,120 @@
+import asyncio
+import time
+
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .metrics import metrics
+
+
+class DigestEntry:
+    """
+    Aggregated notification of a (receiver, blog, type) key within the digest window. Events
+        are merged one at a time under the entry's lock, and an entry whose notification could
+        not be created, or was deleted, is invalidated so that waiting events look it up again.
+    """
+
+    def __init__(self, expires_at: float):
+        self.notification_id = None
+        self.count = 0
+        self.senders: list[str] = []
+        self.event_ids: set[str] = set()
+        self.expires_at = expires_at
+        self.ready = asyncio.Event()
+        self.lock = asyncio.Lock()
+        self.invalid = False
+
+    def add(self, event_id: str, sender_name: str) -> bool:
+        """
+        Adds an event to the aggregate. Events already applied, e.g. delivered to several
+            websockets of the same user, are ignored.
+
+        Parameters:
+            event_id (str): The unique id of the event sent by the api view.
+            sender_name (str): The full name of the user sending the notification.
+        Returns:
+            bool: True if the event is new, or False if it was already applied.
+        """
+        if event_id in self.event_ids:
+            return False
+        self.event_ids.add(event_id)
+        self.count += 1
+        if sender_name in self.senders:
+            self.senders.remove(sender_name)
+        self.senders.insert(0, sender_name)
+        return True
+
+    def display_name(self) -> str:
+        """
+        Returns the senders' names shown in the message, the latest sender first.
+        """
+        if len(self.senders) == 1:
+            return self.senders[0]
+        if len(self.senders) == 2:
+            return f'{self.senders[0]} and {self.senders[1]}'
+        others = len(self.senders) - 2
+        return f'{self.senders[0]}, {self.senders[1]} and {others} other{"s" if others > 1 else ""}'
+
+
+class DigestIndex:
+    """
+    In-memory index of the notifications open for aggregation, keyed by (receiver, blog, type).
+        Entries expire at the end of the window and the least recently created entries are
+        evicted first once the index is full, so lookups never hit the database. The index is
+        kept per worker process: websockets of the same user held by different workers each
+        store their own notification, and repeated deliveries are only recognised within a
+        worker.
+    """
+
+    def __init__(self, window: float, max_entries: int):
+        self.window = window
+        self.max_entries = max_entries
+        self.entries: OrderedDict[tuple, DigestEntry] = OrderedDict()
+
+    def get(self, key: tuple) -> DigestEntry | None:
+        entry = self.entries.get(key)
+        if entry is not None and entry.expires_at <= time.monotonic():
+            del self.entries[key]
+            return None
+        return entry
+
+    def open(self, key: tuple) -> DigestEntry:
+        """
+        Opens a new aggregate for the key, valid until the end of the window.
+        """
+        entry = DigestEntry(expires_at=time.monotonic() + self.window)
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, key: tuple, entry: DigestEntry) -> None:
+        """
+        Removes the entry from the index and marks it invalid for the events waiting on it.
+        """
+        entry.invalid = True
+        if self.entries.get(key) is entry:
+            del self.entries[key]
+
+
+digest_index = DigestIndex(
+    window=settings.NOTIFICATION_DIGEST_WINDOW,
+    max_entries=settings.NOTIFICATION_DIGEST_MAX_ENTRIES
+)
+
+
+def record_digest_outcome(outcome: str) -> None:
+    """
+    Counts how a notification event was stored, and updates the share of events that did not
+        insert a new row.
+
+    Parameters:
+        outcome (str): One of created, merged or duplicates.
+    """
+    metrics.increment(f'notifications.{outcome}')
+    counters = metrics.counters
+    created = counters['notifications.created']
+    saved = counters['notifications.merged'] + counters['notifications.duplicates']
+    metrics.set('notifications.write_reduction', saved / (created + saved))
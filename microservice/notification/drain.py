@@ -0,0 +1,112 @@
+import asyncio
+import random
+import signal
+
+from django.conf import settings
+from django.core import signing
+
+
+RESUME_TOKEN_SALT = 'notification.resume-token'
+
+
+def issue_resume_token(email: str) -> str:
+    """
+    Issues a short-lived signed token allowing the client to reconnect without another
+        round trip to the authentication service.
+
+    Parameters:
+        email (str): The verified email address of the connected user.
+    Returns:
+        str: The signed resume token.
+    """
+    return signing.dumps({'email': email}, salt=RESUME_TOKEN_SALT, compress=True)
+
+
+def verify_resume_token(token: str) -> str | None:
+    """
+    Verifies a resume token locally using the project's secret key.
+
+    Parameters:
+        token (str): The resume token sent by the client.
+    Returns:
+        str: The email address carried by the token.
+        None: The token is forged or expired.
+    """
+    try:
+        payload = signing.loads(
+            token,
+            salt=RESUME_TOKEN_SALT,
+            max_age=settings.RESUME_TOKEN_MAX_AGE
+        )
+    except signing.BadSignature:
+        return None
+    return payload.get('email')
+
+
+class DrainCoordinator:
+    """
+    Keeps track of the websockets accepted by this worker, and drains them before a restart.
+        Once draining, new handshakes are refused and the live sockets are closed in small
+        batches, each client being told when to reconnect (with jitter) and given a resume
+        token, so that the reconnections are spread over time and skip the auth service.
+    """
+
+    def __init__(self):
+        self.connections: set = set()
+        self.draining = False
+        self.signal_installed = False
+        self.drain_task = None
+
+    def register(self, consumer) -> None:
+        self.connections.add(consumer)
+
+    def unregister(self, consumer) -> None:
+        self.connections.discard(consumer)
+
+    def install_signal_handler(self) -> None:
+        """
+        Starts draining when the process receives SIGUSR1, e.g. from a pre-stop hook. The
+            handler is installed lazily on the running event loop, as Daphne owns the loop.
+        """
+        if self.signal_installed:
+            return
+        self.signal_installed = True
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, self.start)
+        except (NotImplementedError, RuntimeError, ValueError, AttributeError):
+            # Not running in the main thread, or the platform has no SIGUSR1.
+            pass
+
+    def start(self) -> None:
+        """
+        Starts draining in the background. The task is kept so that it can't be garbage 
+            collected before every websocket is closed.
+        """
+        if self.drain_task is None:
+            self.drain_task = asyncio.ensure_future(self.drain())
+
+    def reconnect_delay(self) -> int:
+        """
+        Returns the delay in milliseconds after which a drained client should reconnect.
+        """
+        return settings.DRAIN_RECONNECT_DELAY_MS + random.randint(0, settings.DRAIN_RECONNECT_JITTER_MS)
+
+    async def drain(self) -> None:
+        """
+        Closes every live websocket gradually, batch by batch.
+        """
+        if self.draining:
+            return
+        self.draining = True
+
+        consumers = list(self.connections)
+        batch_size = settings.DRAIN_BATCH_SIZE
+        for i in range(0, len(consumers), batch_size):
+            await asyncio.gather(
+                *(consumer.drain(self.reconnect_delay()) for consumer in consumers[i:i + batch_size]),
+                return_exceptions=True
+            )
+            await asyncio.sleep(settings.DRAIN_BATCH_INTERVAL)
+
+
+drain_coordinator = DrainCoordinator()
@@ -0,0 +1,257 @@
+import asyncio
+import time
+
+from collections import Counter, deque
+
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from .digest import digest_index
+from .drain import drain_coordinator
+from .metrics import metrics
+from .topics import topic_index
+
+
+class EventLoopMonitor:
+    """
+    Samples the event loop lag, i.e. how late a sleeping task is woken up. A busy loop delays
+        every websocket and api handler of the worker, so the lag is the first sign of overload.
+    """
+
+    def __init__(self, interval: float, samples: int):
+        self.interval = interval
+        self.lags: deque[float] = deque(maxlen=samples)
+        self.task = None
+
+    def start(self) -> None:
+        """
+        Starts sampling in the running event loop, unless already started.
+        """
+        if self.task is None or self.task.done():
+            self.task = asyncio.ensure_future(self.sample())
+
+    async def sample(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, loop.time() - expected))
+            metrics.set('event_loop.lag_ms', self.lags[-1] * 1000)
+
+    def snapshot(self) -> dict:
+        if not self.lags:
+            return {'last_ms': None, 'max_ms': None, 'samples': 0}
+        return {
+            'last_ms': round(self.lags[-1] * 1000, 2),
+            'max_ms': round(max(self.lags) * 1000, 2),
+            'samples': len(self.lags),
+        }
+
+
+class HandlerTracker:
+    """
+    Keeps the consumer handlers currently running, with their start time, to report the slowest.
+    """
+
+    def __init__(self):
+        self.in_flight: dict[int, tuple[str, str, float]] = {}
+        self.next_id = 0
+
+    def enter(self, consumer_name: str, message_type: str) -> int:
+        self.next_id += 1
+        self.in_flight[self.next_id] = (consumer_name, message_type, time.monotonic())
+        return self.next_id
+
+    def exit(self, handler_id: int) -> None:
+        self.in_flight.pop(handler_id, None)
+
+    def slowest(self, limit: int) -> list[dict]:
+        now = time.monotonic()
+        handlers = sorted(self.in_flight.values(), key=lambda handler: handler[2])[:limit]
+        return [
+            {
+                'consumer': consumer_name,
+                'message_type': message_type,
+                'running_ms': round((now - started) * 1000, 2),
+            }
+            for consumer_name, message_type, started in handlers
+        ]
+
+
+class ReadinessProbe:
+    """
+    Checks the dependencies of the worker: the databases, the channel layer's redis, and the
+        authentication service. The authentication service only gates readiness when tokens are
+        verified remotely; in the local modes it is reported, as the fallback, without failing
+        the probe. Results are cached for a few seconds, and concurrent probes share the same
+        check, so load balancer probes don't hammer the dependencies. The worker also reports not ready when overloaded, i.e. when
+        its event loop lag or its number of websockets exceeds the configured thresholds, so
+        that the load balancer steers new clients away from it.
+    """
+
+    def __init__(self, cache_seconds: float, timeout: float, max_loop_lag_ms: float, max_connections: int):
+        self.cache_seconds = cache_seconds
+        self.timeout = timeout
+        self.max_loop_lag_ms = max_loop_lag_ms
+        self.max_connections = max_connections
+        self.result = None
+        self.checked_at = 0.0
+        self.lock = None
+        self.redis = None
+        self.http = None
+
+    async def check(self) -> dict:
+        """
+        Returns the cached readiness, checking the dependencies again once the cache expires.
+
+        Returns:
+            dict: The readiness status and the outcome of each check.
+        """
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            if self.result is None or time.monotonic() - self.checked_at > self.cache_seconds:
+                self.result = await self.run_checks()
+                self.checked_at = time.monotonic()
+        checks = {**self.result, **self.check_load()}
+        advisory = self.advisory_checks()
+        ready = all(
+            check == 'ok' for name, check in checks.items() if name not in advisory
+        ) and not drain_coordinator.draining
+        return {
+            'status': 'ready' if ready else 'not-ready',
+            'draining': drain_coordinator.draining,
+            'checks': checks,
+            'advisory': sorted(advisory & checks.keys()),
+        }
+
+    @staticmethod
+    def advisory_checks() -> set[str]:
+        """
+        Returns the checks reported without gating readiness.
+        """
+        if settings.AUTH_TOKEN_VERIFIER == 'remote':
+            return set()
+        return {'auth_service'}
+
+    def check_load(self) -> dict:
+        """
+        Compares the latest event loop lag and the number of websockets to the thresholds. These 
+            are read from memory, so they are checked on every probe rather than cached. A 
+            threshold of 0 disables the check.
+
+        Returns:
+            dict: The outcome of the load checks.
+        """
+        checks = {}
+        if self.max_loop_lag_ms:
+            lag_ms = loop_monitor.lags[-1] * 1000 if loop_monitor.lags else 0.0
+            checks['event_loop_lag'] = 'ok' if lag_ms <= self.max_loop_lag_ms else f'overloaded: {lag_ms:.0f} ms'
+        if self.max_connections:
+            connections_count = len(drain_coordinator.connections)
+            checks['connections'] = 'ok' if connections_count <= self.max_connections else f'overloaded: {connections_count}'
+        return checks
+
+    async def run_checks(self) -> dict:
+        names = [f'database.{alias}' for alias in settings.DATABASES] + ['channel_layer']
+        probes = [self.check_database(alias) for alias in settings.DATABASES] + [self.check_redis()]
+        if settings.AUTH_TOKEN_VERIFIER == 'remote' or settings.AUTH_REMOTE_FALLBACK:
+            names.append('auth_service')
+            probes.append(self.check_auth_service())
+
+        results = await asyncio.gather(
+            *(asyncio.wait_for(probe, self.timeout) for probe in probes),
+            return_exceptions=True
+        )
+        return {
+            name: 'ok' if result is True else f'error: {type(result).__name__}'
+            for name, result in zip(names, results)
+        }
+
+    async def check_database(self, alias: str) -> bool:
+        return await sync_to_async(self.connect_database, thread_sensitive=False)(alias, self.timeout)
+
+    @staticmethod
+    def connect_database(alias: str, timeout: float) -> bool:
+        """
+        Runs a query on a dedicated connection rather than one checked out of the pool, as a 
+            pool checkout can't be interrupted and would hold the probe for the pool timeout. 
+            The connection and the query are bounded by the readiness timeout, and it runs on 
+            its own thread so that a stuck check never blocks the request's thread.
+        """
+        import psycopg
+
+        database = settings.DATABASES[alias]
+        timeout_ms = int(timeout * 1000)
+        with psycopg.connect(
+            dbname=database['NAME'],
+            user=database['USER'],
+            password=database['PASSWORD'],
+            host=database['HOST'],
+            port=database['PORT'],
+            connect_timeout=max(1, int(timeout)),
+            options=f'-c statement_timeout={timeout_ms}'
+        ) as connection:
+            connection.execute('SELECT 1').fetchone()
+        return True
+
+    async def check_redis(self) -> bool:
+        if self.redis is None:
+            import redis.asyncio
+
+            host, port = settings.CHANNEL_LAYERS['default']['CONFIG']['hosts'][0]
+            self.redis = redis.asyncio.Redis(host=host, port=int(port))
+        return await self.redis.ping()
+
+    async def check_auth_service(self) -> bool:
+        """
+        The authentication service is reachable if it answers without a server error.
+        """
+        if self.http is None:
+            import httpx
+
+            self.http = httpx.AsyncClient()
+        response = await self.http.get(url=settings.USER_AUTH_API)
+        if response.status_code >= 500:
+            raise ConnectionError(response.status_code)
+        return True
+
+
+def introspect() -> dict:
+    """
+    Collects the live state of the worker process: its websockets by consumer class, the event
+        loop lag, the queue depths, the slowest handlers in flight, and the process metrics. 
+        The database pool gauges are expected to be refreshed beforehand.
+
+    Returns:
+        dict: The introspection report.
+    """
+    channel_layer = get_channel_layer()
+    receive_buffer = getattr(channel_layer, 'receive_buffer', {})
+    return {
+        'draining': drain_coordinator.draining,
+        'connections': dict(Counter(type(consumer).__name__ for consumer in drain_coordinator.connections)),
+        'event_loop_lag': loop_monitor.snapshot(),
+        'queues': {
+            'channel_layer_buffered': sum(queue.qsize() for queue in receive_buffer.values()),
+            'channel_layer_channels': len(receive_buffer),
+            'digest_entries': len(digest_index.entries),
+            'topics': len(topic_index.subscribers),
+        },
+        'slowest_handlers': handler_tracker.slowest(settings.INTROSPECTION_SLOWEST_HANDLERS),
+        'metrics': metrics.snapshot(),
+    }
+
+
+loop_monitor = EventLoopMonitor(
+    interval=settings.EVENT_LOOP_LAG_INTERVAL,
+    samples=settings.EVENT_LOOP_LAG_SAMPLES
+)
+handler_tracker = HandlerTracker()
+readiness_probe = ReadinessProbe(
+    cache_seconds=settings.READINESS_CACHE_SECONDS,
+    timeout=settings.READINESS_CHECK_TIMEOUT,
+    max_loop_lag_ms=settings.READINESS_MAX_LOOP_LAG_MS,
+    max_connections=settings.READINESS_MAX_CONNECTIONS
+)
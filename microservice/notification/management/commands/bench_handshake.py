@@ -0,0 +1,71 @@
+import asyncio
+import statistics
+import time
+
+import jwt
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from notification.middleware import WebsocketAuthMiddleware
+from notification.verifiers import get_verifier
+
+
+class Command(BaseCommand):
+    help = 'Measures the websocket handshake throughput of the authentication middleware.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', choices=['remote', 'hmac', 'jwks'], default=settings.AUTH_TOKEN_VERIFIER)
+        parser.add_argument('--token', help='Access token to present, required in remote and jwks modes.')
+        parser.add_argument('--email', help='Email of a registered user, used to sign a token in hmac mode.')
+        parser.add_argument('--path', default='/ws/event/')
+        parser.add_argument('--handshakes', type=int, default=1000)
+        parser.add_argument('--concurrency', type=int, default=50)
+
+    def handle(self, *args, **options):
+        token = options['token']
+        if token is None:
+            if options['mode'] != 'hmac' or not options['email']:
+                raise CommandError('Provide --token, or --email in hmac mode.')
+            token = jwt.encode(
+                {'email': options['email'], 'verified_email': True, 'exp': int(time.time()) + 3600},
+                settings.AUTH_JWT_SECRET,
+                algorithm=(settings.AUTH_JWT_ALGORITHMS or ['HS256'])[0]
+            )
+
+        latencies, accepted, elapsed = asyncio.run(self.run(token, options))
+
+        self.stdout.write(f"mode:        {options['mode']}")
+        self.stdout.write(f"handshakes:  {len(latencies)} ({accepted} accepted)")
+        self.stdout.write(f"throughput:  {len(latencies) / elapsed:.1f} handshakes/s")
+        self.stdout.write(f"latency p50: {statistics.median(latencies) * 1000:.2f} ms")
+        self.stdout.write(f"latency p95: {statistics.quantiles(latencies, n=20)[-1] * 1000:.2f} ms")
+
+    async def run(self, token: str, options: dict) -> tuple[list[float], int, float]:
+        """
+        Runs the handshakes through the middleware with an app that only records the outcome, 
+            so that the measure covers token verification, the user lookup and authorization.
+        """
+        results = []
+
+        async def app(scope, receive, send):
+            results.append(scope['user_auth'])
+
+        middleware = WebsocketAuthMiddleware(app, verifier=get_verifier(options['mode']))
+        semaphore = asyncio.Semaphore(options['concurrency'])
+        latencies = []
+
+        async def handshake():
+            scope = {
+                'type': 'websocket',
+                'path': options['path'],
+                'query_string': f'Authorization={token}'.encode(),
+            }
+            async with semaphore:
+                start = time.perf_counter()
+                await middleware(scope, None, None)
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(handshake() for _ in range(options['handshakes'])))
+        return latencies, sum(results), time.perf_counter() - start
@@ -0,0 +1,93 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from notification.drain import issue_resume_token
+
+
+# Run in a fresh interpreter, so that nothing is imported beforehand. The first websocket is
+# authenticated with a resume token, to measure the worker itself rather than the auth service.
+COLD_START_SCRIPT = '''
+import time
+start = time.perf_counter()
+
+import asyncio
+import json
+import sys
+
+import config.asgi
+imported = time.perf_counter()
+
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+
+
+async def first_accept():
+    communicator = WebsocketCommunicator(
+        config.asgi.application,
+        sys.argv[1] + "?Resume=" + sys.argv[2],
+        headers=[(b"origin", settings.FRONTEND_ORIGIN.encode())]
+    )
+    connected, _ = await communicator.connect()
+    accepted = time.perf_counter()
+    await communicator.disconnect()
+    return connected, accepted
+
+connected, accepted = asyncio.run(first_accept())
+print(json.dumps({
+    "connected": connected,
+    "import_ms": (imported - start) * 1000,
+    "first_accept_ms": (accepted - start) * 1000,
+}))
+'''
+
+
+class Command(BaseCommand):
+    help = 'Measures the cold start of a worker: import time and time to the first websocket accept.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--email', required=True, help='Email of a registered user.')
+        parser.add_argument('--path', default='/ws/event/')
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--max-import-ms', type=int, default=settings.STARTUP_MAX_IMPORT_MS)
+        parser.add_argument('--max-first-accept-ms', type=int, default=settings.STARTUP_MAX_FIRST_ACCEPT_MS)
+
+    def handle(self, *args, **options):
+        token = issue_resume_token(options['email'])
+        runs = [self.cold_start(options['path'], token) for _ in range(options['runs'])]
+
+        if not all(run['connected'] for run in runs):
+            raise CommandError('The first websocket was not accepted, check the email and the path.')
+
+        import_ms = statistics.median(run['import_ms'] for run in runs)
+        first_accept_ms = statistics.median(run['first_accept_ms'] for run in runs)
+        process_ms = statistics.median(run['process_ms'] for run in runs)
+
+        self.stdout.write(f"profile:         {settings.SERVICE_PROFILE}")
+        self.stdout.write(f"import:          {import_ms:.1f} ms (max {options['max_import_ms']})")
+        self.stdout.write(f"first accept:    {first_accept_ms:.1f} ms (max {options['max_first_accept_ms']})")
+        self.stdout.write(f"process to accept: {process_ms:.1f} ms, interpreter start included")
+
+        if import_ms > options['max_import_ms'] or first_accept_ms > options['max_first_accept_ms']:
+            raise CommandError('Cold start regression: a threshold was exceeded.')
+
+    @staticmethod
+    def cold_start(path: str, token: str) -> dict:
+        start = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, '-c', COLD_START_SCRIPT, path, token],
+            cwd=settings.BASE_DIR,
+            env=os.environ.copy(),
+            capture_output=True,
+            text=True,
+            check=True
+        ).stdout
+        run = json.loads(output.strip().splitlines()[-1])
+        run['process_ms'] = (time.perf_counter() - start) * 1000
+        return run
@@ -0,0 +1,113 @@
+import asyncio
+import random
+import time
+
+from asgiref.sync import ThreadSensitiveContext, sync_to_async
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from notification.db import release_connections, update_pool_metrics
+from notification.middleware import WebsocketAuthMiddleware
+from notification.models import AppNotification, User
+
+
+class Command(BaseCommand):
+    help = 'Runs concurrent notification and user queries, and checks the database connection counts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=5000)
+        parser.add_argument('--concurrency', type=int, default=200)
+        parser.add_argument('--sample-interval', type=float, default=0.25)
+
+    def handle(self, *args, **options):
+        users = list(User.objects.values_list('pk', 'email')[:100])
+        connections.close_all()
+        if not users:
+            raise CommandError('The load test needs registered users.')
+
+        baseline, samples, elapsed = asyncio.run(self.run(users, options))
+
+        pool_max_size = connections.settings['default']['OPTIONS']['pool']['max_size']
+        peak = max(samples) - baseline
+
+        self.stdout.write(f"requests:    {options['requests']} at concurrency {options['concurrency']}")
+        self.stdout.write(f"throughput:  {options['requests'] / elapsed:.1f} requests/s")
+        self.stdout.write(f"connections: {baseline} held by other clients, peak {peak} for this process (default pool limit {pool_max_size})")
+        for alias, stats in update_pool_metrics().items():
+            self.stdout.write(f"pool {alias}: {stats}")
+
+        if peak > pool_max_size:
+            raise CommandError('The connection count exceeded the default pool size: connections are leaking.')
+
+    async def run(self, users: list[tuple], options: dict) -> tuple[int, list[int], float]:
+        """
+        Mixes the user lookups of the websocket handshake with the paginated notification 
+            query of the user notifications view, while a sampler counts the connections on the 
+            primary database. Each notification query runs in its own thread-sensitive context, 
+            as the http requests do under the ASGI handler. The handshake lookups run without 
+            one, as under Daphne, so they share asgiref's single thread-sensitive thread.
+        """
+        semaphore = asyncio.Semaphore(options['concurrency'])
+        samples = []
+        done = asyncio.Event()
+
+        async def handshake_lookup(email: str):
+            try:
+                await WebsocketAuthMiddleware.get_user(email)
+            finally:
+                await release_connections()
+
+        async def notifications_request(user_id: int):
+            async with ThreadSensitiveContext():
+                try:
+                    [n async for n in AppNotification.objects.filter(receiver_id=user_id)[:10]]
+                finally:
+                    await release_connections()
+
+        async def query():
+            user_id, email = random.choice(users)
+            async with semaphore:
+                if random.random() < 0.5:
+                    await handshake_lookup(email)
+                else:
+                    await notifications_request(user_id)
+
+        async def sample():
+            while not done.is_set():
+                samples.append(await self.count_connections())
+                await asyncio.sleep(options['sample_interval'])
+
+        baseline = await self.count_connections(exclude_pools=True)
+        sampler = asyncio.create_task(sample())
+        start = time.perf_counter()
+        await asyncio.gather(*(query() for _ in range(options['requests'])))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await sampler
+        return baseline, samples, elapsed
+
+    @staticmethod
+    @sync_to_async(thread_sensitive=False)
+    def count_connections(exclude_pools: bool = False) -> int:
+        """
+        Counts the server connections on a dedicated connection, outside of the pools, so that 
+            the sampler never waits behind the queued queries. The sampling connection is not 
+            counted, and the baseline also excludes the connections held by the default pool of 
+            this process.
+        """
+        import psycopg
+
+        database = connections.settings['default']
+        with psycopg.connect(
+            dbname=database['NAME'],
+            user=database['USER'],
+            password=database['PASSWORD'],
+            host=database['HOST'],
+            port=database['PORT']
+        ) as connection:
+            count = connection.execute(
+                "SELECT count(*) FROM pg_stat_activity WHERE datname = current_database()"
+            ).fetchone()[0] - 1
+        if exclude_pools:
+            count -= update_pool_metrics().get('default', {}).get('size', 0)
+        return count
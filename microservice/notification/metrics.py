@@ -0,0 +1,30 @@
+from collections import defaultdict
+
+
+class Metrics:
+    """
+    Process-wide registry of the counters and gauges reported by the service. Values are kept 
+        in memory, per worker process, and read through snapshots.
+    """
+
+    def __init__(self):
+        self.counters: dict[str, int] = defaultdict(int)
+        self.gauges: dict[str, float] = {}
+
+    def increment(self, name: str, value: int = 1) -> None:
+        self.counters[name] += value
+
+    def set(self, name: str, value: float) -> None:
+        self.gauges[name] = value
+
+    def snapshot(self) -> dict:
+        """
+        Returns a copy of the current values.
+        """
+        return {
+            'counters': dict(self.counters),
+            'gauges': dict(self.gauges),
+        }
+
+
+metrics = Metrics()
@@ -1,9 +1,9 @@
-import httpx
-
 from urllib.parse import parse_qs
-from django.conf import settings
 
+from .db import release_connections
+from .drain import drain_coordinator, verify_resume_token
 from .models import User
+from .verifiers import TokenVerifier, get_verifier
 
 
 class WebsocketAuthMiddleware:
@@ -11,43 +11,62 @@ class WebsocketAuthMiddleware:
     Custom middleware that checks that the client is authenticated.
     """
 
-    def __init__(self, app):
+    def __init__(self, app, verifier: TokenVerifier | None = None):
         """
         Constructor is called upon the server's start. It stores the ASGI asgi app and 
-            initialises the authentication service url, and the existing channel paths 
-            for later use.
+            initialises the token verifier selected in the settings, and the existing 
+            channel paths for later use.
         """
         self.app = app
-        self.auth_api = settings.USER_AUTH_API
+        self.verifier = verifier or get_verifier()
         self.EVENT_CHANNEL = '/ws/event/'
         self.NOTIFICATION_CHANNEL = '/ws/notification/'
+        self.TOPIC_CHANNEL = '/ws/topic/'
 
     async def __call__(self, scope, receive, send):
         """
         The __call__ method is called before establishing a websocket connection. This method validates 
             the access token issued by the authentication service, and stores the authentication status 
             in the scope dictionary to be used in the notification and event consumer. Thereby, security 
-            is enhanced by rejecting unauthenticated/unauthorized connections.
+            is enhanced by rejecting unauthenticated/unauthorized connections. Clients reconnecting after
+            a drain may present a resume token instead, which is verified locally. While the worker is 
+            draining, handshakes are not authenticated, and the consumers tell the clients to 
+            reconnect later.
         """
         scope['user_auth'] = False 
+        scope['draining'] = drain_coordinator.draining
+        drain_coordinator.install_signal_handler()
+        if scope['draining']:
+            return await self.app(scope, receive, send)
+
         query_string = parse_qs(
             scope['query_string'].decode()
         )
-        if 'Authorization' in query_string.keys():
-            is_authenticated = await self.is_authenticated(
-                query_string['Authorization'][0],
-                scope
-            )
-            if is_authenticated:
-                scope['user_auth'] = True
+        is_authenticated = False
+        try:
+            if 'Resume' in query_string.keys():
+                is_authenticated = await self.is_resumed(
+                    query_string['Resume'][0],
+                    scope
+                )
+            if not is_authenticated and 'Authorization' in query_string.keys():
+                is_authenticated = await self.is_authenticated(
+                    query_string['Authorization'][0],
+                    scope
+                )
+        finally:
+            await release_connections()
+        if is_authenticated:
+            scope['user_auth'] = True
         return await self.app(scope, receive, send)
     
     async def is_authenticated(self, token: str, scope: dict) -> bool:
         """
-        Sends a request to the authentication service in order to validate the token 
-            sent by the client. In the event of a successful authentication the path
-            of the websocket that the user is attempting to connect to, is compared
-            to the existing app channels. If the paths match, the connection is made.
+        Validates the token sent by the client with the configured verifier, either remotely 
+            through the authentication service or locally for signed tokens. In the event of 
+            a successful authentication the path of the websocket that the user is attempting 
+            to connect to, is compared to the existing app channels. If the paths match, the 
+            connection is made.
 
         Parameters:
             token (str): The access token generated by the authentication service.
@@ -55,21 +74,53 @@ class WebsocketAuthMiddleware:
         Returns:
             bool: True or False depending on whether the authentication is validated.
         """
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                url=self.auth_api + token
-            )
-            data = response.json()
-            path = scope['path']
-            if not 'error' in data.keys():
-                if data['verified_email']:
-                    user = await self.get_user(data['email'])
-                    if user:
-                        if path == self.EVENT_CHANNEL:
-                            return await self.authorize_event_channel(scope, user)
-                        if self.NOTIFICATION_CHANNEL in path:
-                            return await self.authorize_notification_channel(path, user)
-            return False
+        claims = await self.verifier.verify(token)
+        if claims:
+            user = await self.get_user(claims['email'])
+            if user:
+                return await self.authorize(scope, user)
+        return False
+
+    async def is_resumed(self, token: str, scope: dict) -> bool:
+        """
+        Validates the resume token handed out to the client when its previous connection 
+            was drained. The token is signed by this service and verified locally, so no 
+            request is sent to the authentication service.
+
+        Parameters:
+            token (str): The resume token issued on drain.
+            scope (dict): Meta data and information about the websocket connection.
+        Returns:
+            bool: True or False depending on whether the authentication is validated.
+        """
+        email = verify_resume_token(token)
+        if email:
+            user = await self.get_user(email)
+            if user:
+                return await self.authorize(scope, user)
+        return False
+
+    async def authorize(self, scope: dict, user: User) -> bool:
+        """
+        Compares the path of the websocket that the authenticated user is attempting to 
+            connect to, to the existing app channels. The user email is kept in the scope 
+            so that a resume token can be issued if the connection is drained.
+
+        Parameters:
+            scope (dict): Meta data and information about the websocket connection.
+            user (User): The user instance.
+        Returns:
+            bool: True if the user is allowed on the channel, or False otherwise.
+        """
+        path = scope['path']
+        scope['user_email'] = user.email
+        if path == self.EVENT_CHANNEL:
+            return await self.authorize_event_channel(scope, user)
+        if path == self.TOPIC_CHANNEL:
+            return await self.authorize_topic_channel(scope, user)
+        if self.NOTIFICATION_CHANNEL in path:
+            return await self.authorize_notification_channel(path, user)
+        return False
         
     async def authorize_notification_channel(self, path: str, user: User): 
         """
@@ -105,6 +156,21 @@ class WebsocketAuthMiddleware:
         scope['user_first_name'] = f'{user.first_name}'
         return True
     
+    async def authorize_topic_channel(self, scope: dict, user: User) -> bool:
+        """
+        Accepts the authenticated user on the topic channel. Each topic subscription is 
+            authorized separately by the consumer, hence the user id is passed through 
+            the scope dictionary.
+
+        Parameters:
+            scope (dict): Meta data and information about the websocket connection.
+            user (User): The user instance.
+        Returns:
+            bool: True as the user authentication is sufficient to open the topic channel.
+        """
+        scope['user_id'] = user.pk
+        return True
+
     @staticmethod
     async def get_user(email: str) -> User | None:
         """
@@ -0,0 +1,139 @@
+import re
+
+from .models import Blog, Category
+
+
+TOPIC_PATTERN = re.compile(r'^(?P<kind>blog|category)_(?P<pk>\d+)$')
+
+
+def topic_group_name(topic: str) -> str:
+    """
+    Builds the channel layer group name associated with a topic.
+
+    Parameters:
+        topic (str): The topic name, e.g. blog_12 or category_3.
+    Returns:
+        str: The group name used to fan out messages to the topic subscribers.
+    """
+    return f'topic_channel_{topic}'
+
+
+def is_valid_topic(topic) -> bool:
+    """
+    Checks that the topic name is one of the supported topic kinds followed by an id.
+
+    Parameters:
+        topic: The topic name sent by the client.
+    Returns:
+        bool: True if the topic is well formed, or False otherwise.
+    """
+    return isinstance(topic, str) and TOPIC_PATTERN.match(topic) is not None
+
+
+async def can_subscribe(topic: str, user_id: int) -> bool:
+    """
+    Checks that the user is allowed to follow the topic. Blog topics are restricted to
+        the blog author and its readers, whereas any authenticated user can follow an
+        existing category.
+
+    Parameters:
+        topic (str): A well formed topic name.
+        user_id (int): The id of the authenticated user.
+    Returns:
+        bool: True if the subscription is allowed, or False otherwise.
+    """
+    match = TOPIC_PATTERN.match(topic)
+    pk = int(match.group('pk'))
+
+    if match.group('kind') == 'blog':
+        blog = await Blog.objects.filter(pk=pk).values('user_id', 'reader_ids').afirst()
+        if blog is None:
+            return False
+        return blog['user_id'] == user_id or str(user_id) in (blog['reader_ids'] or [])
+
+    return await Category.objects.filter(pk=pk).aexists()
+
+
+class TopicIndex:
+    """
+    In-process index of the topic subscriptions held by the websockets of this worker.
+        Both directions are stored as hash sets so that joining and leaving a topic are
+        O(1), and dropping every subscription of a closed socket is linear in the number
+        of topics that socket followed only.
+    """
+
+    def __init__(self):
+        self.subscribers: dict[str, set[str]] = {}
+        self.subscriptions: dict[str, set[str]] = {}
+
+    def join(self, topic: str, channel_name: str) -> bool:
+        """
+        Registers the channel as a subscriber of the topic.
+
+        Parameters:
+            topic (str): The topic name.
+            channel_name (str): The channel layer name of the websocket.
+        Returns:
+            bool: True if the subscription is new, or False if it already existed.
+        """
+        topics = self.subscriptions.setdefault(channel_name, set())
+        if topic in topics:
+            return False
+        topics.add(topic)
+        self.subscribers.setdefault(topic, set()).add(channel_name)
+        return True
+
+    def leave(self, topic: str, channel_name: str) -> bool:
+        """
+        Removes the channel from the topic subscribers.
+
+        Parameters:
+            topic (str): The topic name.
+            channel_name (str): The channel layer name of the websocket.
+        Returns:
+            bool: True if the channel was subscribed to the topic, or False otherwise.
+        """
+        topics = self.subscriptions.get(channel_name)
+        if not topics or topic not in topics:
+            return False
+        topics.discard(topic)
+        if not topics:
+            del self.subscriptions[channel_name]
+
+        channels = self.subscribers[topic]
+        channels.discard(channel_name)
+        if not channels:
+            del self.subscribers[topic]
+        return True
+
+    def leave_all(self, channel_name: str) -> set[str]:
+        """
+        Removes every subscription held by the channel.
+
+        Parameters:
+            channel_name (str): The channel layer name of the websocket.
+        Returns:
+            set[str]: The topics the channel was subscribed to.
+        """
+        topics = self.subscriptions.pop(channel_name, set())
+        for topic in topics:
+            channels = self.subscribers[topic]
+            channels.discard(channel_name)
+            if not channels:
+                del self.subscribers[topic]
+        return topics
+
+    def topics(self, channel_name: str) -> set[str]:
+        """
+        Returns the topics followed by the channel.
+        """
+        return self.subscriptions.get(channel_name, set())
+
+    def subscriber_count(self, topic: str) -> int:
+        """
+        Returns the number of local websockets following the topic.
+        """
+        return len(self.subscribers.get(topic, ()))
+
+
+topic_index = TopicIndex()
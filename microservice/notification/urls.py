@@ -7,5 +7,7 @@ app_name = 'notification'
 urlpatterns = [
     path('send-blog-notification/', views.send_blog_notification),
     path('send-event-notification/', views.send_event_notification),
+    path('send-topic-notification/', views.send_topic_notification),
     path('user-notifications/', views.user_notifications),
+    path('debug/introspection/', views.introspection),
 ]
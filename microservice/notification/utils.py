@@ -12,7 +12,10 @@ class ApiResponse:
     """
     NOTIF_POST_SUCCESS  = {"Response": "Blog notification sent successfully."}
     EVENT_POST_SUCCESS  = {"Response": "Event notification sent successfully."}
+    TOPIC_POST_SUCCESS  = {"Response": "Topic notification sent successfully."}
     NOT_FOUND           = {"Response": "Item requested not found."}
+    ALIVE               = {"status": "alive"}
+    INVALID_TOPIC       = {"Error": "Topic must be blog_<id> or category_<id>."}
     KEY_ERROR           = staticmethod(lambda e: {"Error": f"Missing key: {e}"})
 
 
@@ -0,0 +1,247 @@
+import asyncio
+import time
+
+from abc import ABC, abstractmethod
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+# httpx and jwt are imported on first use rather than when the worker starts, as the
+# verifiers that need them differ between modes and both pull in sizeable dependencies.
+
+
+class TokenVerifier(ABC):
+    """
+    Base class of the access token verifiers used by the websocket middleware. A verifier
+        returns the token claims when the token is valid and belongs to a verified email
+        address, or None otherwise.
+    """
+
+    @abstractmethod
+    async def verify(self, token: str) -> dict | None:
+        """
+        Validates the access token sent by the client.
+
+        Parameters:
+            token (str): The access token generated by the authentication service.
+        Returns:
+            dict: The token claims if the token is valid.
+            None: The token is invalid, or its email address is unverified.
+        """
+
+    @staticmethod
+    def check_claims(claims: dict) -> dict | None:
+        """
+        Checks that the claims carry a verified email address.
+
+        Parameters:
+            claims (dict): The claims of the token.
+        Returns:
+            dict: The claims if the email address is verified.
+            None: The email address is missing or unverified.
+        """
+        if claims.get('email') and claims.get('verified_email'):
+            return claims
+        return None
+
+
+class RemoteTokenVerifier(TokenVerifier):
+    """
+    Verifies the token by sending a request to the authentication service. The HTTP client
+        is shared between handshakes so that the connections to the service are kept alive.
+    """
+
+    def __init__(self, auth_api: str):
+        self.auth_api = auth_api
+        self.client = None
+
+    async def verify(self, token: str) -> dict | None:
+        if self.client is None:
+            import httpx
+
+            self.client = httpx.AsyncClient()
+        response = await self.client.get(
+            url=self.auth_api + token
+        )
+        data = response.json()
+        if 'error' in data.keys():
+            return None
+        return self.check_claims(data)
+
+
+class LocalTokenVerifier(TokenVerifier):
+    """
+    Base class of the verifiers validating signed JWTs locally. Tokens must expire, as they
+        can't be revoked by the authentication service once validated locally. Tokens that 
+        are not JWTs at all, such as the opaque tokens issued by the authentication service, 
+        are handed to the fallback verifier when one is configured.
+    """
+
+    def __init__(self, algorithms: list[str], audience: str | None = None, issuer: str | None = None,
+                 leeway: int = 0, fallback: TokenVerifier | None = None):
+        self.algorithms = algorithms
+        self.audience = audience
+        self.issuer = issuer
+        self.leeway = leeway
+        self.fallback = fallback
+
+    @abstractmethod
+    async def get_key(self, token: str) -> tuple | None:
+        """
+        Returns the key verifying the token signature along with the algorithms it may be used
+            with, or None if no key matches the token.
+        """
+
+    async def verify(self, token: str) -> dict | None:
+        import jwt
+
+        try:
+            match = await self.get_key(token)
+            if match is None:
+                return None
+            key, algorithms = match
+            claims = jwt.decode(
+                token,
+                key=key,
+                algorithms=algorithms,
+                audience=self.audience,
+                issuer=self.issuer,
+                leeway=self.leeway,
+                options={'require': ['exp'], 'verify_aud': self.audience is not None}
+            )
+        except jwt.InvalidSignatureError:
+            return None
+        except jwt.DecodeError:
+            if self.fallback is not None:
+                return await self.fallback.verify(token)
+            return None
+        except jwt.InvalidTokenError:
+            return None
+        except Exception:
+            # Any other failure while checking the key, e.g. a key unusable with the token's
+            # algorithm, rejects the token rather than the handshake crashing.
+            return None
+        return self.check_claims(claims)
+
+
+class HMACTokenVerifier(LocalTokenVerifier):
+    """
+    Verifies JWTs signed with a secret shared with the authentication service.
+    """
+
+    def __init__(self, secret: str, **kwargs):
+        super().__init__(**kwargs)
+        self.secret = secret
+
+    async def get_key(self, token: str) -> tuple:
+        return self.secret, self.algorithms
+
+
+class JWKSTokenVerifier(LocalTokenVerifier):
+    """
+    Verifies JWTs signed with the authentication service's private keys. The public key set
+        is cached and refreshed in the background, and an unknown key id triggers an early
+        refresh at most once per minimum interval, to pick up rotated keys. Each key is only
+        used with its own algorithm, provided it is one of the allowed algorithms, so that the
+        token header can't select another one.
+    """
+
+    def __init__(self, jwks_url: str, refresh_interval: int, min_refresh_interval: int = 30, **kwargs):
+        super().__init__(**kwargs)
+        self.jwks_url = jwks_url
+        self.refresh_interval = refresh_interval
+        self.min_refresh_interval = min_refresh_interval
+        self.keys: dict = {}
+        self.last_refresh = 0.0
+        self.refresh_task = None
+        self.lock = None
+
+    async def refresh(self) -> None:
+        """
+        Fetches the public key set and replaces the cached keys.
+        """
+        import httpx
+        import jwt
+
+        async with httpx.AsyncClient() as client:
+            response = await client.get(url=self.jwks_url)
+            jwk_set = jwt.PyJWKSet.from_dict(response.json())
+        self.keys = {jwk.key_id: jwk for jwk in jwk_set.keys}
+        self.last_refresh = time.monotonic()
+
+    async def refresh_periodically(self) -> None:
+        import httpx
+        import jwt
+
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh()
+            except (httpx.HTTPError, jwt.PyJWKSetError, ValueError):
+                # The cached keys remain in use until the next successful refresh.
+                pass
+
+    async def get_key(self, token: str) -> tuple | None:
+        import httpx
+        import jwt
+
+        kid = jwt.get_unverified_header(token).get('kid')
+
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        if self.refresh_task is None:
+            self.refresh_task = asyncio.create_task(self.refresh_periodically())
+
+        if kid not in self.keys and time.monotonic() - self.last_refresh > self.min_refresh_interval:
+            async with self.lock:
+                if kid not in self.keys and time.monotonic() - self.last_refresh > self.min_refresh_interval:
+                    try:
+                        await self.refresh()
+                    except (httpx.HTTPError, jwt.PyJWKSetError, ValueError):
+                        self.last_refresh = time.monotonic()
+
+        jwk = self.keys.get(kid)
+        if jwk is None or jwk.algorithm_name not in self.algorithms:
+            return None
+        return jwk.key, [jwk.algorithm_name]
+
+
+def get_verifier(mode: str | None = None) -> TokenVerifier:
+    """
+    Builds the token verifier selected in the settings. The remote verifier is used on its own
+        in remote mode, and as the fallback for non-JWT tokens in the local modes.
+
+    Parameters:
+        mode (str): Overrides AUTH_TOKEN_VERIFIER, one of remote, hmac or jwks.
+    Returns:
+        TokenVerifier: The verifier used to validate the clients' access tokens.
+    """
+    mode = mode or settings.AUTH_TOKEN_VERIFIER
+    remote = RemoteTokenVerifier(settings.USER_AUTH_API)
+    if mode == 'remote':
+        return remote
+
+    options = {
+        'audience': settings.AUTH_JWT_AUDIENCE,
+        'issuer': settings.AUTH_JWT_ISSUER,
+        'leeway': settings.AUTH_JWT_LEEWAY,
+        'fallback': remote if settings.AUTH_REMOTE_FALLBACK else None,
+    }
+    if mode == 'hmac':
+        if not settings.AUTH_JWT_SECRET:
+            raise ImproperlyConfigured('AUTH_JWT_SECRET must be set to verify tokens in hmac mode.')
+        return HMACTokenVerifier(
+            secret=settings.AUTH_JWT_SECRET,
+            algorithms=settings.AUTH_JWT_ALGORITHMS or ['HS256'],
+            **options
+        )
+    if mode == 'jwks':
+        if not settings.AUTH_JWKS_URL:
+            raise ImproperlyConfigured('AUTH_JWKS_URL must be set to verify tokens in jwks mode.')
+        return JWKSTokenVerifier(
+            jwks_url=settings.AUTH_JWKS_URL,
+            refresh_interval=settings.AUTH_JWKS_REFRESH_INTERVAL,
+            algorithms=settings.AUTH_JWT_ALGORITHMS or ['RS256', 'ES256'],
+            **options
+        )
+    raise ImproperlyConfigured(f'Unknown token verifier: {mode}')
@@ -1,14 +1,22 @@
+import secrets
+import uuid
+
+from asgiref.sync import sync_to_async
 from adrf.decorators import api_view
 from adrf.requests import Request
 
 from rest_framework.response import Response
 from rest_framework import status
 
+from .db import update_pool_metrics
+from .health import introspect, loop_monitor, readiness_probe
 from .models import AppNotification
 from .serializers import AppNotificationSerializer
+from .topics import is_valid_topic, topic_group_name
 from .utils import ApiResponse, AsyncPaginator, async_serializer
 
 from channels.layers import get_channel_layer
+from django.conf import settings
 
 
 @api_view(['POST'])
@@ -37,6 +45,7 @@ async def send_blog_notification(request: Request) -> Response:
         validated_data['sender_id'] = sender.pk
         validated_data['receiver_id'] = receiver.pk
         validated_data['sender_name'] = f'{sender.first_name} {sender.last_name}'
+        validated_data['event_id'] = uuid.uuid4().hex
 
         channel_layer = get_channel_layer()
         await channel_layer.group_send(
@@ -82,6 +91,43 @@ async def send_event_notification(request: Request) -> Response:
     return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
 
+@api_view(['POST'])
+async def send_topic_notification(request: Request) -> Response:
+    """
+    Api view to send real-time notifications to every client following a topic, such as 
+        the readers of a blog (blog_<id>) or the followers of a category (category_<id>).
+        A single message is published to the topic group and the channel layer fans it 
+        out to the subscribed websockets. As for events, nothing is stored in the database.
+
+    Parameters:
+        request (Request): User request handled by the framework.
+    Returns:
+        Response: A JSON object indicating the status of the operation.
+    """
+    if request.method == 'POST':
+        try:
+            data = request.data
+            topic = data['topic']
+            message = data['message']
+        except KeyError as e:
+            return Response(data=ApiResponse.KEY_ERROR(e), status=status.HTTP_400_BAD_REQUEST)
+
+        if not is_valid_topic(topic):
+            return Response(data=ApiResponse.INVALID_TOPIC, status=status.HTTP_400_BAD_REQUEST)
+
+        channel_layer = get_channel_layer()
+        await channel_layer.group_send(
+            topic_group_name(topic),
+            {
+                'type': 'send.topic',
+                'topic': topic,
+                'message': message
+            }
+        )
+        return Response(data=ApiResponse.TOPIC_POST_SUCCESS, status=status.HTTP_201_CREATED)
+    return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
+
+
 @api_view(['GET'])
 async def user_notifications(request: Request) -> Response:
     """
@@ -104,4 +150,60 @@ async def user_notifications(request: Request) -> Response:
             return Response(ApiResponse.NOT_FOUND, status=status.HTTP_404_NOT_FOUND)
         paginator = AsyncPaginator(items_per_page=10)
         return await paginator.response(AppNotificationSerializer, notifications, request)
-    return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
\ No newline at end of file
+    return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
+
+
+@api_view(['GET'])
+async def healthz(request: Request) -> Response:
+    """
+    Liveness probe. It answers as long as the worker's event loop runs, without checking any
+        dependency, so that a slow dependency never gets the worker restarted.
+
+    Parameters:
+        request (Request): User request handled by the framework.
+    Returns:
+        Response: A JSON object indicating that the worker is alive.
+    """
+    loop_monitor.start()
+    return Response(data=ApiResponse.ALIVE, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+async def readyz(request: Request) -> Response:
+    """
+    Readiness probe. The worker is ready when its databases, the channel layer and, in the 
+        remote verification mode, the authentication service are reachable, and it isn't 
+        draining nor overloaded. The dependency checks are cached for a few seconds so that 
+        the probes don't hammer them.
+
+    Parameters:
+        request (Request): User request handled by the framework.
+    Returns:
+        Response: A JSON object containing the readiness status and the outcome of each check.
+    """
+    loop_monitor.start()
+    readiness = await readiness_probe.check()
+    if readiness['status'] == 'ready':
+        return Response(data=readiness, status=status.HTTP_200_OK)
+    return Response(data=readiness, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+
+@api_view(['GET'])
+async def introspection(request: Request) -> Response:
+    """
+    Debug api view reporting the live state of the worker process: websockets per consumer 
+        class, event loop lag, queue depths, slowest handlers in flight and process metrics. 
+        It requires the introspection token in the X-Introspection-Token header, and is 
+        disabled when no token is configured.
+
+    Parameters:
+        request (Request): User request handled by the framework.
+    Returns:
+        Response: A JSON object containing the introspection report.
+    """
+    token = request.headers.get('X-Introspection-Token', '')
+    if not settings.INTROSPECTION_TOKEN or not secrets.compare_digest(token, settings.INTROSPECTION_TOKEN):
+        return Response(ApiResponse.NOT_FOUND, status=status.HTTP_404_NOT_FOUND)
+    loop_monitor.start()
+    await sync_to_async(update_pool_metrics)()
+    return Response(data=introspect(), status=status.HTTP_200_OK)
\ No newline at end of file